@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+import collections
 import datetime
+import functools
+import hashlib
+import itertools
 import math
+import operator
 import os
+import pickle
 import random
 import re
 import string
@@ -49,7 +55,8 @@ OUTPUT_PREAMBLE = """
 #     },
 #     'abbr': 'AP',
 #     'header': 'Auroria Planet PvE',
-#     'radius': 250000
+#     'radius': 250000,
+#     'radius_squared': 62500000000
 # }
 SECTORS = [
     {
@@ -169,6 +176,10 @@ SECTORS = [
     }
 ]
 
+# Sector abbreviation to its index in SECTORS
+SECTOR_INDEX = {
+    sector['abbr']: index for (index, sector) in enumerate(SECTORS)}
+
 # Ore abbreviation, in priority order
 ORES = [
     'U',
@@ -183,6 +194,9 @@ ORES = [
     'FE'
 ]
 
+# Ore abbreviation to its priority, 0 being the highest priority
+ORE_PRIORITY = {ore: priority for (priority, ore) in enumerate(ORES)}
+
 CLUSTER_PREFIX = 'Cluster'
 
 # 2km
@@ -191,6 +205,40 @@ DUPLICATE_RESOURCE_DISTANCE_METERS = 2 * 1000
 # 500km
 DUPLICATE_CLUSTER_DISTANCE_METERS = 500 * 1000
 
+# Characters replaced or removed when making a GPS folder name
+FOLDER_NAME_TRANSLATION = str.maketrans({
+    ' ': '_',
+    '(': None,
+    ')': None,
+    ',': None
+})
+
+# 1MiB
+INPUT_BUFFER_SIZE = 1 << 20
+
+# Parsed input files are cached here so unchanged files don't need to be parsed
+# again.
+CACHE_DIRECTORY = os.path.join(
+    os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'se_gps')
+
+# Increment when the parsed coordinate format changes to invalidate the cache
+CACHE_VERSION = 1
+
+# Radius in a sector GPS name, e.g. '(R250km)'
+SECTOR_RADIUS_REGEX = re.compile(r'\(R(\d+)km\)')
+
+# Resource name, e.g. 'AP U (1M), FE (2M)_2'
+RESOURCE_NAME_REGEX = re.compile(
+    r'^\s*(?P<sector>\S+)\s+(?P<ores>.+?)(_\d+)?$')
+
+# One ore and optional size in the ores of a resource name, e.g. 'U (1M),'
+ORE_REGEX = re.compile(r'\s*(?P<ore>[A-Z]+)(\s+(?P<size>[^,]+)\s*,?)?')
+
+# Ore size, e.g. '(1.5M)'
+ORE_SIZE_REGEX = re.compile(r'\(?(([\d.]+)([KMB]))\)?')
+
 
 def main():
     """
@@ -218,8 +266,7 @@ def main():
 
     process_sectors()
 
-    with open(input_filename) as handle:
-        coordinates = read_coordinates_from_handle(handle)
+    coordinates = read_coordinates(input_filename)
 
     (clusters, resources) = sort_coordinates(coordinates)
 
@@ -236,37 +283,39 @@ def main():
 
     largest_resources = get_largest_resources(resources)
 
-    clusters.sort(
-        key=lambda cluster: sector_index(cluster['sector']), reverse=True)
+    clusters.sort(key=operator.itemgetter('sector_index'), reverse=True)
+
+    # Build the whole output first and write it in one call
+    output = []
+
+    current_date = datetime.datetime.today().strftime('%Y.%m.%d')
+    output.append(f"# Up-to-date as of {current_date}\n#\n")
+    output.append(f'{OUTPUT_PREAMBLE}\n\n')
+
+    output.append('# Largest Deposits of Each Ore Mined So Far:\n')
+    for resource in largest_resources:
+        output.append(f'{coordinate_to_se_gps(resource)}\n')
+    output.append('\n')
 
     current_sector_header = None
 
+    for cluster in clusters:
+
+        # Print header if different than the last header
+        header = SECTORS[cluster['sector_index']]['header']
+        if header != current_sector_header:
+            output.append(f'\n# {header}:\n\n')
+            current_sector_header = header
+
+        if 'resources' in cluster:
+            output.append(f'{coordinate_to_se_gps(cluster)}\n')
+            cluster['resources'].sort(key=operator.itemgetter('ore_priority'))
+            for resource in cluster['resources']:
+                output.append(f'{coordinate_to_se_gps(resource)}\n')
+            output.append('\n')
+
     with open(output_filename, 'w') as handle:
-        current_date = datetime.datetime.today().strftime('%Y.%m.%d')
-        handle.write(f"# Up-to-date as of {current_date}\n#\n")
-        handle.write(f'{OUTPUT_PREAMBLE}\n\n')
-
-        handle.write('# Largest Deposits of Each Ore Mined So Far:\n')
-        for resource in largest_resources:
-            handle.write(f'{coordinate_to_se_gps(resource)}\n')
-        handle.write('\n')
-
-        for cluster in clusters:
-
-            # Print header if different than the last header
-            for sector in SECTORS:
-                if sector['abbr'] == cluster['sector']:
-                    if sector['header'] != current_sector_header:
-                        handle.write(f'\n# {sector["header"]}:\n\n')
-                        current_sector_header = sector['header']
-
-            if 'resources' in cluster:
-                handle.write(f'{coordinate_to_se_gps(cluster)}\n')
-                cluster['resources'].sort(
-                    key=lambda coord: ORES.index(coord['name'].split()[1]))
-                for resource in cluster['resources']:
-                    handle.write(f'{coordinate_to_se_gps(resource)}\n')
-                handle.write('\n')
+        handle.write(''.join(output))
 
     print(f'Coordinates output to {output_filename}')
 
@@ -286,17 +335,13 @@ def sector_index(sector_abbr):
         The index of the sector.
     """
 
-    for i in range(len(SECTORS)):
-        if SECTORS[i]['abbr'] == sector_abbr:
-            return i
-
-    return -1
+    return SECTOR_INDEX.get(sector_abbr, -1)
 
 
 def process_sectors():
     """
     Process sectors, converting the GPS string into a coordinate dict. Adds the
-    radius.
+    radius, and the radius squared for comparing against squared distances.
 
     Raises
     ------
@@ -308,11 +353,12 @@ def process_sectors():
         coordinate = parse_coordinate(sector['coordinate'], sector['abbr'])
         sector['coordinate'] = coordinate
 
-        radius_match = re.search(r'\(R(\d+)km\)', coordinate['name'])
+        radius_match = SECTOR_RADIUS_REGEX.search(coordinate['name'])
         if radius_match is None:
             raise Exception(
                 f"Unexpected sector GPS name: {coordinate['name']}")
         sector['radius'] = int(radius_match.group(1)) * 1000
+        sector['radius_squared'] = sector['radius'] ** 2
 
 
 def usage():
@@ -324,6 +370,105 @@ def usage():
     print('\t./se_gps.py <input_file> <output_file>')
 
 
+def read_coordinates(input_filename):
+    """
+    Read and parse the coordinates in a file. The parsed coordinates are
+    cached, and reused as long as the file and the sectors haven't changed.
+
+    Parameters
+    ----------
+    input_filename : str
+        The file to read the coordinates from.
+
+    Returns
+    -------
+    list
+        The list of parsed coordinates.
+    """
+
+    input_filename = os.path.abspath(input_filename)
+    input_stat = os.stat(input_filename)
+
+    # The sector of each coordinate is found while parsing, so the sectors are
+    # part of the key.
+    cache_key = (
+        CACHE_VERSION,
+        input_filename,
+        input_stat.st_mtime_ns,
+        input_stat.st_size,
+        repr(SECTORS))
+
+    cache_name = hashlib.sha256(input_filename.encode()).hexdigest()
+    cache_filename = os.path.join(CACHE_DIRECTORY, f'{cache_name}.pkl')
+
+    coordinates = load_cached_coordinates(cache_filename, cache_key)
+    if coordinates is not None:
+        return coordinates
+
+    with open(input_filename, buffering=INPUT_BUFFER_SIZE) as handle:
+        coordinates = read_coordinates_from_handle(handle)
+
+    save_cached_coordinates(cache_filename, cache_key, coordinates)
+
+    return coordinates
+
+
+def load_cached_coordinates(cache_filename, cache_key):
+    """
+    Load parsed coordinates from a cache file.
+
+    Parameters
+    ----------
+    cache_filename : str
+        The cache file.
+    cache_key : tuple
+        The key the coordinates must have been cached with.
+
+    Returns
+    -------
+    list | None
+        The list of cached coordinates, or None if the cache file doesn't
+        exist, can't be read, or was saved with a different key.
+    """
+
+    try:
+        with open(cache_filename, 'rb') as handle:
+            (saved_key, coordinates) = pickle.load(handle)
+    except Exception:
+        # Missing or unreadable cache, parse the input again
+        return None
+
+    if saved_key != cache_key:
+        return None
+
+    return coordinates
+
+
+def save_cached_coordinates(cache_filename, cache_key, coordinates):
+    """
+    Save parsed coordinates to a cache file. Failing to save the cache is not
+    an error, a warning is printed to stderr.
+
+    Parameters
+    ----------
+    cache_filename : str
+        The cache file.
+    cache_key : tuple
+        The key to save the coordinates with.
+    coordinates : list
+        The list of parsed coordinates.
+    """
+
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        with open(cache_filename, 'wb') as handle:
+            pickle.dump(
+                (cache_key, coordinates), handle,
+                protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as error:
+        sys.stderr.write(f'Unable to write cache file: {error}\n')
+
+
 def read_coordinates_from_handle(coordinate_input):
     """
     Reads the coordinates from the file handle, parse them, and return the list
@@ -342,14 +487,18 @@ def read_coordinates_from_handle(coordinate_input):
 
     coordinates = []
     for coordinate_line in coordinate_input:
-        coordinate = parse_coordinate(coordinate_line)
+        coordinate_line = coordinate_line.strip()
+        if not coordinate_line or coordinate_line[0] == '#':
+            # Skip empty lines and comments
+            continue
+        coordinate = parse_coordinate(coordinate_line, pre_stripped=True)
         if coordinate is None:
             continue
         coordinates.append(coordinate)
     return coordinates
 
 
-def parse_coordinate(coordinate_line, sector=None):
+def parse_coordinate(coordinate_line, sector=None, pre_stripped=False):
     """
     Parse a coordinate line, returning the coordinate dictionary.
 
@@ -360,6 +509,9 @@ def parse_coordinate(coordinate_line, sector=None):
     sector : str | None
         Optional. If not set the sector will be discovered from the sector
         list.
+    pre_stripped : bool
+        Optional. If True the coordinate line has already been stripped and
+        is known not to be empty or a comment, so those checks are skipped.
 
     Returns
     -------
@@ -378,16 +530,19 @@ def parse_coordinate(coordinate_line, sector=None):
         None is returned.
     """
 
-    coordinate_line = coordinate_line.strip()
-    if len(coordinate_line) == 0:
-        # Empty line, just skip
-        return None
+    if not pre_stripped:
+        coordinate_line = coordinate_line.strip()
+        if len(coordinate_line) == 0:
+            # Empty line, just skip
+            return None
 
-    if coordinate_line.startswith('#'):
-        # Skip comments
-        return None
+        if coordinate_line.startswith('#'):
+            # Skip comments
+            return None
 
-    coordinate_tokens = coordinate_line.split(':')
+    # Only the first seven tokens are used. Split off an eighth so the notes
+    # token stops at its closing ':' and the rest of the line isn't split.
+    coordinate_tokens = coordinate_line.split(':', 7)
     if len(coordinate_tokens) < 7:
         sys.stderr.write(
             f'Bad coordinate, wrong number of tokens: {coordinate_line}\n')
@@ -429,9 +584,25 @@ def find_coordinate_sector(coordinate):
         The coordinate was not in a sector.
     """
 
+    (x, y, z) = coordinate_position(coordinate)
+
     for sector in SECTORS:
-        distance = check_distance(sector['coordinate'], coordinate)
-        if distance < sector['radius']:
+        center = sector['coordinate']
+        radius = sector['radius']
+
+        # Reject sectors whose bounding box doesn't contain the coordinate
+        # before doing the full distance check.
+        dx = x - center['x']
+        if abs(dx) > radius:
+            continue
+        dy = y - center['y']
+        if abs(dy) > radius:
+            continue
+        dz = z - center['z']
+        if abs(dz) > radius:
+            continue
+
+        if dx * dx + dy * dy + dz * dz < sector['radius_squared']:
             return sector['abbr']
 
     raise Exception(f'No sector fonud for coordinate: {str(coordinate)}')
@@ -455,58 +626,181 @@ def deduplicate_coordinates(coordinates, min_distance):
         The coordinates with duplicates removed.
     """
 
-    for coordinate in coordinates:
-        if is_duplicate(coordinate):
+    grid = build_grid(coordinates, min_distance)
+
+    # False for each coordinate marked as a duplicate, by index
+    keep_mask = [True] * len(coordinates)
+
+    for index in range(len(coordinates)):
+        if not keep_mask[index]:
             continue
-        duplicates = find_duplicates(coordinate, coordinates, min_distance)
+        duplicates = find_duplicates(
+            index, coordinates, grid, min_distance, keep_mask)
         if len(duplicates) > 0:
-            handle_duplicates(duplicates)
-
-    deduped_coordinates = []
-    for coordinate in coordinates:
-        if not is_duplicate(coordinate):
-            deduped_coordinates.append(coordinate)
+            handle_duplicates(duplicates, keep_mask)
 
-    return deduped_coordinates
+    # Later prompts can mark earlier coordinates, so only filter once every
+    # duplicate has been handled.
+    return list(itertools.compress(coordinates, keep_mask))
 
 
-def find_duplicates(coordinate, coordinates, min_distance):
+def find_duplicates(index, coordinates, grid, min_distance, keep_mask):
     """
     Find duplicates coordinates.
 
     Parameters
     ----------
-    coordinate : dict
-        The coordinate to test against.
+    index : int
+        The index of the coordinate to test against.
     coordinates : list
         The list of coordinates.
+    grid : dict
+        The grid of coordinates, as returned by build_grid(). The cell size
+        must be min_distance.
+    min_distance : int
+        Distance in meters. Coordinates within this distance will be considered
+        duplicates.
+    keep_mask : list
+        A bool for each coordinate, False if it's already marked as a
+        duplicate. Marked coordinates are skipped.
 
     Returns
     -------
-    list
-        The list of tuples (dict, int). Each tuple contains a duplicate
-        coordinate and the distance between the coordinates.
+    list | tuple
+        The list of tuples (int, dict, int). Each tuple contains the index of a
+        duplicate coordinate, the coordinate, and the distance between the
+        coordinates. The first tuple is the tested coordinate itself.
+
+        If there are no duplicates an empty tuple is returned.
     """
 
-    duplicates = []
+    coordinate = coordinates[index]
+    position = coordinate_position(coordinate)
 
-    for test_coordinate in coordinates:
-        if coordinate == test_coordinate:
-            continue
-        if is_duplicate(test_coordinate):
-            continue
-        if coordinate['sector'] != test_coordinate['sector']:
+    # Only allocated once a duplicate is found, which is rare
+    duplicates = None
+
+    # Sort the candidates so duplicates are listed in input order
+    for (test_index, test_position) in sorted(
+            find_nearby(coordinate, grid, min_distance)):
+        if test_index == index or not keep_mask[test_index]:
             continue
-        distance = check_distance(coordinate, test_coordinate)
+        distance = math.dist(position, test_position)
         if distance < min_distance:
-            duplicates.append((test_coordinate, distance))
+            if duplicates is None:
+                duplicates = [(index, coordinate, 0)]
+            duplicates.append(
+                (test_index, coordinates[test_index], round(distance)))
 
-    if len(duplicates) > 0:
-        duplicates.insert(0, (coordinate, 0))
+    if duplicates is None:
+        return ()
 
     return duplicates
 
 
+def build_grid(coordinates, cell_size):
+    """
+    Bucket coordinates into a grid of cubic cells so nearby coordinates can be
+    found without comparing every pair of coordinates. The position of each
+    coordinate is stored with it in the grid, so distances can be calculated
+    without looking the position up in the coordinate again.
+
+    Parameters
+    ----------
+    coordinates : list
+        The list of coordinates.
+    cell_size : int
+        The length of a cell edge in meters.
+
+    Returns
+    -------
+    dict
+        Maps a cell, as returned by grid_cell(), to a list of tuples
+        (int, tuple). Each tuple contains the index of a coordinate in the
+        cell and its position, as returned by coordinate_position().
+    """
+
+    grid = {}
+    for index in range(len(coordinates)):
+        add_to_grid(grid, coordinates[index], index, cell_size)
+    return grid
+
+
+def add_to_grid(grid, coordinate, index, cell_size):
+    """
+    Add a coordinate to a grid.
+
+    Parameters
+    ----------
+    grid : dict
+        The grid, as returned by build_grid().
+    coordinate : dict
+        The coordinate to add.
+    index : int
+        The index of the coordinate in its coordinate list.
+    cell_size : int
+        The length of a cell edge in meters.
+    """
+
+    grid.setdefault(grid_cell(coordinate, cell_size), []).append(
+        (index, coordinate_position(coordinate)))
+
+
+def grid_cell(coordinate, cell_size):
+    """
+    Get the grid cell a coordinate is in. Cells never span sectors, so only
+    coordinates in the same sector share a cell.
+
+    Parameters
+    ----------
+    coordinate : dict
+        The coordinate.
+    cell_size : int
+        The length of a cell edge in meters.
+
+    Returns
+    -------
+    tuple (str, int, int, int)
+        The sector and the x, y, z cell position.
+    """
+
+    return (
+        coordinate['sector'],
+        math.floor(coordinate['x'] / cell_size),
+        math.floor(coordinate['y'] / cell_size),
+        math.floor(coordinate['z'] / cell_size))
+
+
+def find_nearby(coordinate, grid, cell_size):
+    """
+    Find the coordinates in the same grid cell as the coordinate or in an
+    adjacent cell. Every coordinate in the grid within cell_size meters
+    of the coordinate is included, some further ones may be too.
+
+    Parameters
+    ----------
+    coordinate : dict
+        The coordinate to search around.
+    grid : dict
+        The grid, as returned by build_grid().
+    cell_size : int
+        The length of a cell edge in meters.
+
+    Returns
+    -------
+    list
+        The list of tuples (int, tuple). Each tuple contains the index of a
+        nearby coordinate and its position.
+    """
+
+    (sector, x, y, z) = grid_cell(coordinate, cell_size)
+
+    nearby = []
+    for (dx, dy, dz) in itertools.product((-1, 0, 1), repeat=3):
+        nearby.extend(grid.get((sector, x + dx, y + dy, z + dz), ()))
+    return nearby
+
+
 def check_distance(a, b):
     """
     Calculate the distance between two coordinates.
@@ -525,33 +819,28 @@ def check_distance(a, b):
         meter.
     """
 
-    return round(math.sqrt(
-        (b['x'] - a['x']) ** 2 +
-        (b['y'] - a['y']) ** 2 +
-        (b['z'] - a['z']) ** 2))
+    return round(math.dist(coordinate_position(a), coordinate_position(b)))
 
 
-def is_duplicate(coordinate):
+def coordinate_position(coordinate):
     """
-    Check if a coordinate has been marked as a duplicate coordinate.
+    Get the position of a coordinate.
 
     Parameters
     ----------
     coordinate : dict
-        The coordinate to check if it's a duplicate.
+        The coordinate.
 
     Returns
     -------
-    bool
-        True if the coordinate is a duplicate, False otherwise.
+    tuple (float, float, float)
+        The x, y, z position of the coordinate in meters.
     """
 
-    if 'duplicate' in coordinate:
-        return coordinate['duplicate']
-    return False
+    return (coordinate['x'], coordinate['y'], coordinate['z'])
 
 
-def handle_duplicates(duplicates):
+def handle_duplicates(duplicates, keep_mask):
     """
     Notify the user of the duplicate. Prompt the user to choose which one to
     mark as a duplicate.
@@ -559,14 +848,17 @@ def handle_duplicates(duplicates):
     Parameters
     ----------
     duplicates : list
-        List of tuples (dict, int). The coordinates, and distance to the first
-        coordinate in the list that are duplicates.
+        List of tuples (int, dict, int). The indices, coordinates, and distance
+        to the first coordinate in the list that are duplicates.
+    keep_mask : list
+        A bool for each coordinate, False if it's marked as a duplicate. The
+        coordinates not kept are set to False.
     """
 
     print('Duplicate coordinates found!')
     print()
     index = 1
-    for (coordinate, distance) in duplicates:
+    for (_, coordinate, distance) in duplicates:
         print(f"\t{index}) {coordinate['name']} ({distance}m)")
         index += 1
     print()
@@ -575,7 +867,7 @@ def handle_duplicates(duplicates):
         try:
             response = int(input('Choose which coordinate to keep: ').strip())
             if response >= 1 and response <= index:
-                mark_duplicates(duplicates, response - 1)
+                mark_duplicates(duplicates, response - 1, keep_mask)
                 break
         except Exception:
             # Fall through to the invalid response
@@ -586,26 +878,30 @@ def handle_duplicates(duplicates):
     print()
 
 
-def mark_duplicates(duplicates, skip_index):
+def mark_duplicates(duplicates, skip_index, keep_mask):
     """
     Mark all but one coordinates as duplicates.
 
     Parameters
     ----------
-    duplicates : tuple (dist, int)
-        The list of duplicates. The first element is the coordinate, the second
-        element is the distance to the first duplicate coordinate.
+    duplicates : tuple (int, dict, int)
+        The list of duplicates. The first element is the index of the
+        coordinate, the second element is the coordinate, the third element is
+        the distance to the first duplicate coordinate.
     skip_index : int
         The index to skip. One coordinate will be kept and not marked as a
         duplicate. This is the index of that coordinate. Skip this coordinate,
         not marking it as a duplicate.
+    keep_mask : list
+        A bool for each coordinate, False if it's marked as a duplicate. The
+        marked coordinates are set to False.
     """
 
     for i in range(len(duplicates)):
         if i == skip_index:
             continue
-        (coordinate, _) = duplicates[i]
-        coordinate['duplicate'] = True
+        (index, _, _) = duplicates[i]
+        keep_mask[index] = False
 
 
 def sort_coordinates(coordinates):
@@ -648,6 +944,7 @@ def cluster_coordinates(clusters, resources):
     clusters : list
         A list of dicts. The cluster coordinates. The resources key is added to
         each cluster. It contains a list of resources that is near the cluster.
+        The sector_index key is also added, for sorting clusters by sector.
     resources : list
         A list of dicts. The resource coordinates. The resources are added to
         the clusters based on distance.
@@ -655,15 +952,23 @@ def cluster_coordinates(clusters, resources):
 
     new_clusters = []
 
+    # Nearest cluster distances are rounded, so leave a meter of slack so
+    # every cluster that rounds to within range is in an adjacent cell.
+    cell_size = DUPLICATE_CLUSTER_DISTANCE_METERS + 1
+    grid = build_grid(clusters, cell_size)
+
     for cluster in clusters:
         # Add the cluster to its own group
         cluster['notes'] = sanitize_folder_name(cluster['name'])
+        cluster['sector_index'] = sector_index(cluster['sector'])
 
     for resource in resources:
-        (distance, cluster) = find_nearest_cluster(resource, clusters)
+        (distance, cluster) = find_nearest_cluster(
+            resource, clusters, grid, cell_size)
         if distance is None or distance > DUPLICATE_CLUSTER_DISTANCE_METERS:
             cluster = create_cluster_for_resource(resource)
             clusters.append(cluster)
+            add_to_grid(grid, cluster, len(clusters) - 1, cell_size)
             new_clusters.append(cluster)
 
         # Add the cluster to a folder
@@ -700,8 +1005,7 @@ def create_cluster_for_resource(resource):
 
     """
 
-    random_name_postfix = ''.join(
-        random.SystemRandom().choice(string.ascii_uppercase) for _ in range(4))
+    random_name_postfix = ''.join(random.choices(string.ascii_uppercase, k=4))
     name = f'{CLUSTER_PREFIX} {random_name_postfix}'
 
     cluster = {
@@ -711,12 +1015,14 @@ def create_cluster_for_resource(resource):
         'z': resource['z'],
         'colour': resource['colour'],
         'notes': sanitize_folder_name(name),
-        'sector': resource['sector']
+        'sector': resource['sector'],
+        'sector_index': sector_index(resource['sector'])
     }
 
     return cluster
 
 
+@functools.lru_cache(maxsize=None)
 def sanitize_folder_name(name):
     """
     Sanitize a GPS folder name.
@@ -732,17 +1038,13 @@ def sanitize_folder_name(name):
         The sanitized GPS folder name.
     """
 
-    name = name.replace(' ', '_')
-    name = name.replace('(', '')
-    name = name.replace(')', '')
-    name = name.replace(',', '')
-
-    return name
+    return name.translate(FOLDER_NAME_TRANSLATION)
 
 
-def find_nearest_cluster(resource, clusters):
+def find_nearest_cluster(resource, clusters, grid, cell_size):
     """
-    Find the cluster nearest the resource.
+    Find the cluster nearest the resource. Only clusters in the grid cells
+    around the resource are considered.
 
     Parameters
     ----------
@@ -750,6 +1052,10 @@ def find_nearest_cluster(resource, clusters):
         The resource coordinate.
     clusters : list
         The list of cluster coordinates
+    grid : dict
+        The grid of clusters, as returned by build_grid().
+    cell_size : int
+        The length of a grid cell edge in meters.
 
     Returns
     -------
@@ -758,21 +1064,26 @@ def find_nearest_cluster(resource, clusters):
         nearest cluster in meters. The second element is the nearest cluster
         coordinate.
 
-        If no cluster is in the same sector as the resource (None, None) is
-        returned.
+        If there are no clusters in the grid cells around the resource
+        (None, None) is returned.
     """
 
+    position = coordinate_position(resource)
+
     nearest_cluster = None
     nearest_cluster_distance = None
-    for cluster in clusters:
-        if cluster['sector'] != resource['sector']:
-            continue
-        distance = check_distance(resource, cluster)
+    # Sort the candidates so ties go to the first cluster in the list
+    for (index, cluster_position) in sorted(
+            find_nearby(resource, grid, cell_size)):
+        distance = math.dist(position, cluster_position)
         if (nearest_cluster_distance is None or
                 distance < nearest_cluster_distance):
-            nearest_cluster = cluster
+            nearest_cluster = clusters[index]
             nearest_cluster_distance = distance
 
+    if nearest_cluster_distance is not None:
+        nearest_cluster_distance = round(nearest_cluster_distance)
+
     return (nearest_cluster_distance, nearest_cluster)
 
 
@@ -792,19 +1103,16 @@ def coordinate_to_se_gps(coordinate):
         A GPS string that can be imported into Space Engineers.
     """
 
-    name = coordinate['name']
-    x = str(coordinate['x'])
-    y = str(coordinate['y'])
-    z = str(coordinate['z'])
-    colour = coordinate['colour']
-    notes = coordinate['notes']
-
-    return f'GPS:{name}:{x}:{y}:{z}:{colour}:{notes}:'
+    return (
+        f"GPS:{coordinate['name']}:{str(coordinate['x'])}:"
+        f"{str(coordinate['y'])}:{str(coordinate['z'])}:"
+        f"{coordinate['colour']}:{coordinate['notes']}:")
 
 
 def fix_names(resources):
     """
-    Fix and normalize all resource names.
+    Fix and normalize all resource names. Adds the size and the priority of
+    the first ore.
 
     Parameters
     ----------
@@ -821,6 +1129,7 @@ def fix_names(resources):
         (normalized_name, size) = normalized_values
         resource['name'] = normalized_name
         resource['size'] = size
+        resource['ore_priority'] = ORE_PRIORITY[normalized_name.split()[1]]
 
 
 def normalize_name(name, sector):
@@ -841,15 +1150,14 @@ def normalize_name(name, sector):
         name is invalid and couldn't be normalized.
     """
 
-    sector_match = re.match(
-        r'^\s*(?P<sector>\S+)\s+(?P<ores>.+?)(_\d+)?$', name)
+    sector_match = RESOURCE_NAME_REGEX.match(name)
     if sector_match is None:
         return None
 
     existing_sector = sector_match.group('sector').upper()
     ores = sector_match.group('ores').upper()
 
-    if existing_sector in ORES:
+    if existing_sector in ORE_PRIORITY:
         # If sector is an ore just assume sector is missing and continue.
         ores = f'{existing_sector} {ores}'
     elif not valid_sector(existing_sector):
@@ -858,8 +1166,7 @@ def normalize_name(name, sector):
 
     first_size = None
     valid_ores = []
-    for ores_match in re.finditer(
-            r'\s*(?P<ore>[A-Z]+)(\s+(?P<size>[^,]+)\s*,?)?', ores):
+    for ores_match in ORE_REGEX.finditer(ores):
 
         ore = ores_match.group('ore')
         size = ores_match.group('size')
@@ -871,27 +1178,24 @@ def normalize_name(name, sector):
         if first_size is None:
             first_size = size_parsed
 
-        if ore not in ORES:
+        if ore not in ORE_PRIORITY:
             sys.stderr.write(f'Invalid ore: {ore}\n')
             return None
 
         valid_ores.append((ore, size))
 
-    valid_ores.sort(key=lambda valid_ore: ORES.index(valid_ore[0]))
+    valid_ores.sort(key=lambda valid_ore: ORE_PRIORITY[valid_ore[0]])
 
-    normalized_name = f"{sector}"
-    first = True
-    for valid_ore in valid_ores:
-        if first:
-            first = False
-            normalized_name += ' '
+    ore_names = []
+    for (ore_name, ore_size) in valid_ores:
+        if ore_size is None:
+            ore_names.append(ore_name)
         else:
-            normalized_name += ' , '
+            ore_names.append(f'{ore_name} {ore_size}')
 
-        (ore_name, ore_size) = valid_ore
-        normalized_name += ore_name
-        if ore_size is not None:
-            normalized_name += f' {ore_size}'
+    normalized_name = sector
+    if len(ore_names) > 0:
+        normalized_name = f"{sector} {' , '.join(ore_names)}"
 
     return (normalized_name, first_size)
 
@@ -916,7 +1220,7 @@ def normalize_size(size):
 
     size = size.strip()
 
-    match = re.match(r'\(?(([\d.]+)([KMB]))\)?', size)
+    match = ORE_SIZE_REGEX.match(size)
     if match is None:
         return (size, 0)
 
@@ -949,10 +1253,7 @@ def valid_sector(sector_abbr):
         True if it's a valid sector abbreviation, False otherwise.
     """
 
-    for sector in SECTORS:
-        if sector['abbr'] == sector_abbr:
-            return True
-    return False
+    return sector_abbr in SECTOR_INDEX
 
 
 def make_names_unique(resources):
@@ -967,15 +1268,21 @@ def make_names_unique(resources):
         unique.
     """
 
-    name_hash = {}
+    name_counts = collections.Counter(
+        resource['name'] for resource in resources)
+
+    # The next suffix to use for each repeated name. The first resource with a
+    # name keeps it unchanged, the second one gets the suffix _2.
+    name_suffixes = {}
 
     for resource in resources:
         name = resource['name']
-        if name in name_hash:
-            resource['name'] = f'{name} _{name_hash[name]}'
-            name_hash[name] += 1
-        else:
-            name_hash[name] = 2
+        if name_counts[name] == 1:
+            continue
+        suffix = name_suffixes.get(name, 1)
+        if suffix > 1:
+            resource['name'] = f'{name} _{suffix}'
+        name_suffixes[name] = suffix + 1
 
 
 def get_largest_resources(resources):
@@ -996,8 +1303,7 @@ def get_largest_resources(resources):
     largest_resources = {}
 
     for resource in resources:
-        match = re.match(r'^\S+\s+(\S+)', resource['name'])
-        ore = match.group(1)
+        ore = ORES[resource['ore_priority']]
         if ore in largest_resources:
             if largest_resources[ore]['size'] < resource['size']:
                 largest_resources[ore] = resource